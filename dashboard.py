@@ -6,6 +6,8 @@ import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 from datetime import datetime, timedelta
 from pathlib import Path
+import os
+import tempfile
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -29,6 +31,18 @@ COLORS = {
     'purple': '#9467bd'
 }
 
+# Máximo de porciones del pie antes de agrupar el resto en 'Otras'
+MAX_PIE_SLICES = 8
+# A partir de cuántos puntos las series de líneas se dibujan con WebGL
+WEBGL_MIN_POINTS = 1000
+# Máximo de puntos que se envían al navegador por serie de líneas (el resto se reduce con LTTB)
+LTTB_MAX_POINTS = 2000
+# Semilla de los datos sintéticos; junto con sortearlos sobre todas las filas antes de
+# filtrar, hace que un evento reciba los mismos valores en cada rerun y en cada vista
+RANDOM_SEED = 42
+# Combinaciones de filtros (rango de fechas, categoría) que se guardan en caché por versión
+MAX_FILTER_CACHE_ENTRIES = 32
+
 # CSS personalizado
 st.markdown("""
 <style>
@@ -60,34 +74,205 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# Carpeta con los datos limpios generados por src/main.ipynb
+CLEAN_DIR = Path("./src/clean")
+
+# Tipos explícitos (alias de Arrow) de las columnas que el dashboard usa de cada tabla.
+# Los ids se leen como float64: el notebook los escribe tras to_numeric(errors='coerce') y
+# un solo nulo los deja como '355908.0'; downcast_ids los reduce luego a enteros si puede
+SCHEMAS = {
+    'categoria': {'id': 'float64', 'categoria': 'string'},
+    'cliente': {'id': 'float64', 'nombre': 'string', 'apellido': 'string'},
+    'events': {'visitorid': 'float64', 'event': 'string', 'itemid': 'float64',
+               'transactionid': 'float64', 'event_time': 'timestamp[ns]'},
+    'marca': {'id': 'float64', 'marca': 'string'},
+    'producto': {'id': 'float64', 'categoria_id': 'float64', 'nombre': 'string',
+                 'marca_id': 'float64', 'precio': 'float64'},
+}
+
+# Columnas que el dashboard usa de cada tabla; el resto no se lee
+NEEDED = {name: list(schema) for name, schema in SCHEMAS.items()}
+
+# Columnas de texto con pocos valores; Arrow las decodifica directo a category
+CATEGORY_COLUMNS = {
+    'events': ['event'],
+}
+
+def arrow_column_types(name):
+    """Tipos Arrow de una tabla para el lector CSV, sin inferencia (las de CATEGORY_COLUMNS como diccionario)"""
+    import pyarrow as pa
+    types = {col: pa.type_for_alias(alias) for col, alias in SCHEMAS[name].items()}
+    for col in CATEGORY_COLUMNS.get(name, []):
+        types[col] = pa.dictionary(pa.int32(), pa.string())
+    return types
+
+def parquet_is_fresh(csv_path, parquet_path):
+    """El Parquet existe y no es más viejo que su CSV (o el CSV ya no está)"""
+    if not parquet_path.exists():
+        return False
+    return not csv_path.exists() or parquet_path.stat().st_mtime >= csv_path.stat().st_mtime
+
+def convert_clean_to_parquet(data_dir=CLEAN_DIR):
+    """Convertir los CSV limpios a Parquet (snappy); solo reescribe si el CSV es más nuevo"""
+    import pyarrow as pa
+    import pyarrow.csv as pv
+    import pyarrow.parquet as pq
+
+    for name in NEEDED:
+        csv_path = data_dir / f"{name}_clean.csv"
+        parquet_path = csv_path.with_suffix('.parquet')
+        if not csv_path.exists() or parquet_is_fresh(csv_path, parquet_path):
+            continue
+        convert_options = pv.ConvertOptions(column_types=arrow_column_types(name))
+        try:
+            table = pv.read_csv(csv_path, convert_options=convert_options)
+        except pa.ArrowInvalid:
+            # Valores fuera del esquema: esta tabla se sigue leyendo desde el CSV
+            continue
+        # Se escribe a un temporal en la misma carpeta y se reemplaza de forma atómica:
+        # otra sesión nunca ve un Parquet a medio escribir
+        fd, tmp_path = tempfile.mkstemp(dir=data_dir, suffix='.parquet.tmp')
+        os.close(fd)
+        try:
+            pq.write_table(table, tmp_path, compression='snappy')
+            os.replace(tmp_path, parquet_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+def read_clean_table(name, data_dir=CLEAN_DIR):
+    """Leer una tabla limpia con solo las columnas necesarias (Parquet, o CSV como respaldo)"""
+    parquet_path = data_dir / f"{name}_clean.parquet"
+    csv_path = data_dir / f"{name}_clean.csv"
+    # Un Parquet más viejo que su CSV (conversión fallida o pendiente) no se usa
+    if parquet_is_fresh(csv_path, parquet_path):
+        import pyarrow.parquet as pq
+        available = pq.read_schema(parquet_path).names
+        columns = [c for c in NEEDED[name] if c in available]
+        dictionary = [c for c in CATEGORY_COLUMNS.get(name, []) if c in columns]
+        return pd.read_parquet(parquet_path, columns=columns, engine='pyarrow', read_dictionary=dictionary)
+    try:
+        import pyarrow as pa
+        import pyarrow.csv as pv
+    except ImportError:
+        # Sin pyarrow solo se fijan los tipos numéricos; las fechas se convierten en load_events
+        dtype = {col: t for col, t in SCHEMAS[name].items() if t in ('int64', 'float64')}
+        return pd.read_csv(csv_path, usecols=lambda c: c in NEEDED[name], dtype=dtype)
+    # Lector multihilo de Arrow con tipos explícitos; se proyectan solo las columnas
+    # presentes en el encabezado
+    available = pv.open_csv(csv_path).schema.names
+    try:
+        table = pv.read_csv(
+            csv_path,
+            read_options=pv.ReadOptions(use_threads=True),
+            convert_options=pv.ConvertOptions(
+                include_columns=[c for c in NEEDED[name] if c in available],
+                column_types=arrow_column_types(name),
+            ),
+        )
+    except pa.ArrowInvalid:
+        # Valores que no encajan en el esquema: pandas infiere los tipos
+        return pd.read_csv(csv_path, usecols=lambda c: c in NEEDED[name])
+    return table.to_pandas()
+
+def data_version(data_dir=CLEAN_DIR):
+    """Huella de los archivos limpios en disco (mtime de cada CSV/Parquet) para invalidar los cachés"""
+    stamps = []
+    for name in NEEDED:
+        for suffix in ('.csv', '.parquet'):
+            path = data_dir / f"{name}_clean{suffix}"
+            stamps.append(path.stat().st_mtime_ns if path.exists() else None)
+    return tuple(stamps)
+
+# Columnas de ids por tabla que se reducen al entero más pequeño posible
+ID_COLUMNS = {
+    'categoria': ['id'],
+    'cliente': ['id'],
+    'events': ['visitorid', 'itemid'],
+    'marca': ['id'],
+    'producto': ['id', 'categoria_id', 'marca_id'],
+}
+
+def downcast_ids(df, name):
+    """Reducir los ids de una tabla a int8/16/32 (las columnas con nulos o no numéricas se dejan igual)"""
+    for col in ID_COLUMNS[name]:
+        if col in df.columns and pd.api.types.is_numeric_dtype(df[col]):
+            df[col] = pd.to_numeric(df[col], downcast='integer')
+    return df
+
+def fast_nunique(s):
+    """Contar valores únicos no nulos con np.unique (ordenamiento en C, sin hash set)"""
+    a = s.to_numpy()
+    return np.unique(a[~pd.isna(a)]).size
+
+@st.cache_data
+def load_events(version):
+    """Cargar los eventos limpios (``version`` solo forma parte de la clave del caché)"""
+    events = downcast_ids(read_clean_table('events'), 'events')
+    
+    # Parquet y el lector de Arrow ya entregan timestamp; solo el respaldo de pd.read_csv convierte
+    if 'event_time' in events.columns and not pd.api.types.is_datetime64_any_dtype(events['event_time']):
+        events['event_time'] = pd.to_datetime(events['event_time'], errors='coerce')
+    # transactionid tiene nulos (eventos sin compra): entero nulable en vez de float64,
+    # así los groupby/nunique por transacción trabajan sobre enteros
+    if 'transactionid' in events.columns:
+        events['transactionid'] = pd.to_numeric(events['transactionid'].astype('Int64'), downcast='integer')
+    # Ordenados por fecha (NaT al final): el filtro de fechas usa búsqueda binaria
+    if 'event_time' in events.columns:
+        events = events.sort_values('event_time', kind='stable', ignore_index=True)
+    # Pocos tipos de evento: como category se agrupan por código entero
+    # (Arrow ya lo entrega así; solo el respaldo de pd.read_csv necesita convertir)
+    if 'event' in events.columns:
+        events['event'] = events['event'].astype('category')
+    
+    return events
+
 @st.cache_data
+def load_products_and_brands(version):
+    """Cargar productos (indexados por id para el join) y marcas"""
+    producto = downcast_ids(read_clean_table('producto'), 'producto').set_index('id')
+    marca = downcast_ids(read_clean_table('marca'), 'marca')
+    return producto, marca
+
+@st.cache_data
+def load_categories_and_clients(version):
+    """Cargar categorías y clientes"""
+    categoria = downcast_ids(read_clean_table('categoria'), 'categoria')
+    cliente = downcast_ids(read_clean_table('cliente'), 'cliente')
+    return categoria, cliente
+
 def load_data():
-    """Cargar datos limpios desde la carpeta clean"""
+    """Cargar datos limpios desde la carpeta clean, junto con la versión de archivos usada"""
     try:
-        data_dir = Path("./src/clean")
-        
-        categoria = pd.read_csv(data_dir / "categoria_clean.csv")
-        cliente = pd.read_csv(data_dir / "cliente_clean.csv")
-        events = pd.read_csv(data_dir / "events_clean.csv")
-        marca = pd.read_csv(data_dir / "marca_clean.csv")
-        producto = pd.read_csv(data_dir / "producto_clean.csv")
+        try:
+            convert_clean_to_parquet()
+        except (ImportError, OSError):
+            # Sin pyarrow o sin permisos de escritura se leen directamente los CSV
+            pass
         
-        # Convertir columnas de fecha que existen
-        if 'nacimiento' in cliente.columns:
-            cliente['nacimiento'] = pd.to_datetime(cliente['nacimiento'], errors='coerce')
-        if 'event_time' in events.columns:
-            events['event_time'] = pd.to_datetime(events['event_time'], errors='coerce')
-        if 'date' in events.columns:
-            events['date'] = pd.to_datetime(events['date'], errors='coerce')
+        # Los cachés se invalidan solos cuando cambia algún archivo en disco
+        version = data_version()
+        events = load_events(version)
+        categoria, cliente = load_categories_and_clients(version)
+        # Siempre se cargan: sin itemid las marcas sintéticas salen de marca['id'] y el
+        # tamaño del catálogo se muestra en las métricas
+        producto, marca = load_products_and_brands(version)
         
-        return categoria, cliente, events, marca, producto
+        return categoria, cliente, events, marca, producto, version
         
     except Exception as e:
         st.error(f"Error cargando datos: {e}")
-        return None, None, None, None, None
+        return None, None, None, None, None, None
 
-def create_sales_data(events, producto, categoria, marca, cliente):
-    """Crear dataset de ventas combinando eventos con información de productos"""
+def create_sales_data(events, producto, categoria, marca, cliente, date_range=None, category=None):
+    """Crear dataset de ventas combinando eventos con información de productos.
+
+    Los filtros de fecha y categoría se aplican antes de los merges para que estos
+    solo procesen las filas que sobreviven; el de fecha asume ``events`` ordenado
+    por ``event_time`` (como lo deja ``load_events``). Devuelve ``(sales_data, meta)``,
+    donde ``meta`` guarda conteos conocidos al construir el dataset y, sin filtros,
+    los agregados de los KPIs.
+    """
     
     # Verificar qué columnas opcionales existen
     has_transactionid = 'transactionid' in events.columns
@@ -95,213 +280,402 @@ def create_sales_data(events, producto, categoria, marca, cliente):
     has_precio = 'precio' in producto.columns
     has_marca_id = 'marca_id' in producto.columns
     
+    # Un solo generador (PCG64, con semilla) para todos los datos sintéticos; se re-siembra
+    # en cada llamada, por eso los sorteos deben cubrir siempre las mismas filas
+    rng = np.random.default_rng(RANDOM_SEED)
+    
     # Filtrar eventos con transactionid si existe, sino usar todos los eventos
+    only_transactions = True
     if has_transactionid:
-        sales_events = events[events['transactionid'].notna()].copy()
+        # El indexado booleano ya devuelve un frame nuevo; no hace falta .copy()
+        sales_events = events[events['transactionid'].notna()]
         if sales_events.empty:
             # Si no hay transacciones, usar todos los eventos
-            sales_events = events.copy()
+            sales_events = events
+            only_transactions = False
     else:
-        sales_events = events.copy()
+        sales_events = events
+    
+    # Los datos sintéticos se sortean sobre todas las filas candidatas, antes de los
+    # filtros: así cada evento recibe los mismos valores en cualquier vista filtrada
+    # (assign crea el frame nuevo; los eventos recibidos no se modifican)
+    synthetic = {}
+    if not has_itemid:
+        # Si no hay itemid, crear categorías/marcas sintéticas para demostración
+        categoria_ids = categoria['id'].to_numpy()
+        synthetic['categoria_id'] = categoria_ids[rng.integers(0, len(categoria_ids), len(sales_events))]
+        if has_marca_id and not marca.empty:
+            marca_ids = marca['id'].to_numpy()
+            synthetic['marca_id'] = marca_ids[rng.integers(0, len(marca_ids), len(sales_events))]
+    if not (has_itemid and has_precio):
+        # Sin precio, simular revenue basado en eventos (uniforme en [50, 500), ya en float32)
+        synthetic['revenue'] = rng.random(len(sales_events), dtype=np.float32) * 450 + 50
+    if synthetic:
+        sales_events = sales_events.assign(**synthetic)
+    
+    # Filtro de fecha sobre los eventos, antes de cualquier merge
+    if date_range is not None and 'event_time' in sales_events.columns:
+        # Con event_time ordenado el rango es un slice contiguo: dos búsquedas binarias
+        # en lugar de dos máscaras sobre todas las filas
+        start_date, end_date = date_range
+        start_ts = pd.Timestamp(start_date)
+        end_ts = pd.Timestamp(end_date) + pd.Timedelta(days=1)
+        event_time = sales_events['event_time'].to_numpy()
+        lo, hi = np.searchsorted(event_time, [start_ts.to_datetime64(), end_ts.to_datetime64()])
+        sales_events = sales_events.iloc[lo:hi]
     
-    # Solo hacer merge con productos si itemid existe
+    # Ids de la categoría seleccionada (tabla pequeña)
+    if category is not None:
+        category_ids = categoria.loc[categoria['categoria'] == category, 'id'].to_numpy()
+    
+    # Solo unir con productos si itemid existe
     if has_itemid:
-        # Preparar columnas de producto para merge
-        producto_cols = ['id', 'categoria_id', 'nombre']
+        # Preparar columnas de producto para el join (producto ya viene indexado por id)
+        producto_cols = ['categoria_id', 'nombre']
         if has_marca_id:
             producto_cols.append('marca_id')
         if has_precio:
             producto_cols.append('precio')
-            
-        sales_data = sales_events.merge(producto[producto_cols], 
-                                       left_on='itemid', right_on='id', how='left')
-        sales_data.rename(columns={'nombre': 'producto_nombre'}, inplace=True)
+        
+        # Primero se reducen los eventos a los productos de esa categoría, antes del join
+        if category is not None:
+            item_ids = producto.index[producto['categoria_id'].isin(category_ids)].to_numpy()
+            sales_events = sales_events[np.isin(sales_events['itemid'].to_numpy(), item_ids)]
+        
+        prod_lookup = producto[producto_cols].rename(columns={'nombre': 'producto_nombre'})
+        sales_data = sales_events.join(prod_lookup, on='itemid')
     else:
-        sales_data = sales_events.copy()
-        # Si no hay itemid, crear datos sintéticos para demostración
-        sales_data['categoria_id'] = np.random.choice(categoria['id'].tolist(), len(sales_data))
-        if has_marca_id and not marca.empty:
-            sales_data['marca_id'] = np.random.choice(marca['id'].tolist(), len(sales_data))
+        # Las categorías/marcas sintéticas ya se asignaron antes de los filtros
+        sales_data = sales_events
     
-    # Merge con categorías
-    sales_data = sales_data.merge(categoria[['id', 'categoria']], 
-                                 left_on='categoria_id', right_on='id', 
-                                 how='left', suffixes=('', '_cat'))
-    sales_data.rename(columns={'categoria': 'categoria_nombre'}, inplace=True)
+    # Filtro de categoría por id sobre las filas ya reducidas; cubre las categorías
+    # sintéticas y los productos con id repetido en más de una categoría
+    if category is not None:
+        sales_data = sales_data[sales_data['categoria_id'].isin(category_ids)]
     
-    # Merge con marcas si existe marca_id
+    # Nombre de categoría por lookup id -> nombre (sin merge ni columnas id duplicadas)
+    categoria_map = categoria.set_index('id')['categoria']
+    derived = {'categoria_nombre': sales_data['categoria_id'].map(categoria_map)}
+    
+    # Nombre de marca si existe marca_id
     if has_marca_id and not marca.empty:
-        sales_data = sales_data.merge(marca[['id', 'marca']], 
-                                     left_on='marca_id', right_on='id', 
-                                     how='left', suffixes=('', '_marca'))
-        sales_data.rename(columns={'marca': 'marca_nombre'}, inplace=True)
+        marca_map = marca.set_index('id')['marca']
+        derived['marca_nombre'] = sales_data['marca_id'].map(marca_map)
     else:
-        sales_data['marca_nombre'] = 'Sin Marca'
+        derived['marca_nombre'] = 'Sin Marca'
     
     # Calcular revenue
-    if has_precio and 'precio' in sales_data.columns:
-        sales_data['revenue'] = sales_data['precio'].fillna(100)  # Precio por defecto
+    if has_itemid and has_precio:
+        revenue = sales_data['precio']
+        # fillna copia la columna entera; solo hace falta si hay precios nulos
+        if revenue.hasnans:
+            revenue = revenue.fillna(100)  # Precio por defecto
     else:
-        # Simular revenue basado en eventos
-        sales_data['revenue'] = np.random.uniform(50, 500, len(sales_data))
+        # Revenue simulado, sorteado antes de los filtros
+        revenue = sales_data['revenue']
+    # float32 basta para precios y reduce a la mitad la memoria de los groupby
+    derived['revenue'] = revenue.astype('float32', copy=False)
     
     # Agregar información temporal si existe event_time
     if 'event_time' in sales_data.columns and sales_data['event_time'].notna().any():
-        sales_data['year'] = sales_data['event_time'].dt.year
-        sales_data['month'] = sales_data['event_time'].dt.month
-        sales_data['day_name'] = sales_data['event_time'].dt.day_name()
-        sales_data['hour'] = sales_data['event_time'].dt.hour
+        # Componentes como enteros angostos (weekday 0 = lunes reemplaza a day_name, que
+        # creaba un string por fila), calculados con aritmética entera sobre el mismo
+        # buffer datetime64 en lugar de un pase del accesor .dt por campo
+        event_time = sales_data['event_time'].to_numpy().astype('datetime64[ns]', copy=False)
+        # Fecha como datetime64[D] (respaldada por enteros) en lugar de objetos date de .dt.date
+        event_date = event_time.astype('datetime64[D]')
+        days = event_date.view('int64')
+        months = event_time.astype('datetime64[M]').view('int64')
+        time_parts = {
+            'year': (months // 12 + 1970, 'int16'),
+            'month': (months % 12 + 1, 'int8'),
+            'weekday': ((days + 3) % 7, 'int8'),  # 1970-01-01 fue jueves
+            'hour': ((event_time.view('int64') // 3_600_000_000_000) % 24, 'int8'),
+        }
+        nat = np.isnat(event_time)
+        has_nat = nat.any()
+        for col, (values, dtype) in time_parts.items():
+            values = values.astype(dtype)
+            # Con fechas nulas los componentes son enteros nulables (enmascarados en los NaT)
+            derived[col] = pd.arrays.IntegerArray(values, nat) if has_nat else values
+        derived['event_date'] = event_date
+    
+    # Todas las columnas derivadas en un solo assign: una asignación, sin frames intermedios
+    sales_data = sales_data.assign(**derived)
     
-    return sales_data
+    # Dimensiones de texto como category: los groupby usan códigos enteros en vez de strings
+    for col in ('categoria_nombre', 'marca_nombre'):
+        if col in sales_data.columns:
+            sales_data[col] = sales_data[col].astype('category')
+    
+    # Todas las filas son transacciones salvo que se haya caído al respaldo de
+    # todos los eventos (sin transactionid, cada evento cuenta como transacción)
+    meta = {
+        'n_events': len(events),
+        'n_transactions': len(sales_data) if only_transactions else 0,
+        'n_visitors': fast_nunique(sales_data['visitorid']) if 'visitorid' in sales_data.columns else 0,
+        'n_items': fast_nunique(sales_data['itemid']) if 'itemid' in sales_data.columns else 0,
+    }
+    # Agregados de los KPIs, calculados junto al dataset (y cacheados con él); los KPIs
+    # solo se muestran para los datos sin filtrar, así que las vistas filtradas no los pagan
+    if date_range is None and category is None:
+        meta.update(summarize_sales(sales_data))
+    
+    return sales_data, meta
+
+@st.cache_data(show_spinner=False, max_entries=MAX_FILTER_CACHE_ENTRIES)
+def load_sales_data(_tables, version, date_range=None, category=None):
+    """Dataset de ventas cacheado por versión de los archivos y filtros.
 
-def calculate_kpis(sales_data, events, cliente):
-    """Calcular KPIs principales"""
+    ``_tables`` (events, producto, categoria, marca, cliente) no se hashea: la
+    clave del caché es solo ``version`` y los filtros, así un rerun no recorre
+    los DataFrames para calcular el hash.
+    """
+    events, producto, categoria, marca, cliente = _tables
+    return create_sales_data(events, producto, categoria, marca, cliente,
+                             date_range=date_range, category=category)
+
+def summarize_sales(sales_data):
+    """Agregados por visitante y por transacción que alimentan los KPIs"""
+    summary = {'clv_mean': 0, 'aov': 0, 'items_per_txn': 0, 'ticket_mean': 0, 'repeat_customers': 0}
+    if sales_data.empty or 'visitorid' not in sales_data.columns:
+        return summary
+    has_transactionid = 'transactionid' in sales_data.columns
+    
+    # Un solo groupby-agg por clave: visitante (KPIs 1 y 6) y transacción (KPIs 4 y 5)
+    visitor_aggs = {'revenue': ('revenue', 'sum')}
+    if has_transactionid:
+        visitor_aggs['n_txn'] = ('transactionid', 'nunique')
+    by_visitor = sales_data.groupby('visitorid', sort=False).agg(**visitor_aggs)
     
     # KPI 1: Customer Lifetime Value (CLV) aproximado
-    if not sales_data.empty and 'visitorid' in sales_data.columns:
-        customer_revenue = sales_data.groupby('visitorid')['revenue'].sum()
-        avg_clv = customer_revenue.mean()
-        
-        # KPI 2: Tasa de conversión (transacciones vs total de eventos)
-        total_events = len(events)
-        # Contar transacciones reales si existe transactionid, sino usar todos los sales_data
-        if 'transactionid' in sales_data.columns:
-            transactions = sales_data['transactionid'].notna().sum()
-        else:
-            transactions = len(sales_data)
-        conversion_rate = (transactions / total_events * 100) if total_events > 0 else 0
-        
-        # KPI 3: Ticket promedio
-        avg_order_value = sales_data['revenue'].mean()
-        
-        # KPI 4: Productos únicos por transacción
-        if 'transactionid' in sales_data.columns and 'itemid' in sales_data.columns:
-            avg_items_per_transaction = sales_data.groupby('transactionid')['itemid'].nunique().mean()
-        else:
-            avg_items_per_transaction = 1.0  # Asumir 1 item por evento
+    summary['clv_mean'] = by_visitor['revenue'].mean()
+    
+    # KPI 3: Ticket promedio
+    summary['aov'] = sales_data['revenue'].mean()
+    
+    if has_transactionid:
+        txn_aggs = {'revenue': ('revenue', 'sum')}
+        if 'itemid' in sales_data.columns:
+            txn_aggs['n_items'] = ('itemid', 'nunique')
+        by_txn = sales_data.groupby('transactionid', sort=False).agg(**txn_aggs)
+    
+    # KPI 4: Productos únicos por transacción
+    if has_transactionid and 'itemid' in sales_data.columns:
+        summary['items_per_txn'] = by_txn['n_items'].mean()
+    else:
+        summary['items_per_txn'] = 1.0  # Asumir 1 item por evento
+    
+    # KPI 5: Ticket promedio por transacción
+    if has_transactionid:
+        summary['ticket_mean'] = by_txn['revenue'].mean()
+    else:
+        summary['ticket_mean'] = summary['aov']
+    
+    # KPI 6: Clientes con más de una compra
+    if has_transactionid:
+        summary['repeat_customers'] = int((by_visitor['n_txn'] > 1).sum())
+    
+    return summary
 
-        # KPI 5: Ticket promedio por transacción
-        if 'transactionid' in sales_data.columns:
-            ticket_promedio = sales_data.groupby('transactionid')['revenue'].sum().mean()
-        else:
-            ticket_promedio = sales_data['revenue'].mean()
+def calculate_kpis(meta):
+    """Calcular KPIs principales con los agregados que create_sales_data deja en meta"""
+    
+    if meta['n_visitors'] > 0:
+        # KPI 2: Tasa de conversión (transacciones vs total de eventos)
+        total_events = meta['n_events']
+        conversion_rate = (meta['n_transactions'] / total_events * 100) if total_events > 0 else 0
         
         # KPI 6: Tasa de repetición de clientes
-        if 'visitorid' in sales_data.columns:
-            compras_por_cliente = sales_data.groupby('visitorid')['transactionid'].nunique()
-            clientes_recurrentes = (compras_por_cliente > 1).sum()
-            tasa_repeticion = (clientes_recurrentes / compras_por_cliente.count() * 100) if compras_por_cliente.count() > 0 else 0
-        else:
-            tasa_repeticion = 0
-        
+        tasa_repeticion = meta['repeat_customers'] / meta['n_visitors'] * 100
     else:
-        avg_clv = 0
         conversion_rate = 0
-        avg_order_value = 0
-        avg_items_per_transaction = 0
-        ticket_promedio = 0
         tasa_repeticion = 0
     
     return {
-        'avg_clv': avg_clv,
+        'avg_clv': meta['clv_mean'],
         'conversion_rate': conversion_rate,
-        'avg_order_value': avg_order_value,
-        'avg_items_per_transaction': avg_items_per_transaction,
-        'ticket_promedio': ticket_promedio,
+        'avg_order_value': meta['aov'],
+        'avg_items_per_transaction': meta['items_per_txn'],
+        'ticket_promedio': meta['ticket_mean'],
         'tasa_repeticion': tasa_repeticion
     }
 
+def compute_aggregates(sales_data):
+    """Revenue por categoría, marca, fecha, cliente y producto, calculado una vez para todos los gráficos"""
+    keys = [c for c in ('categoria_nombre', 'marca_nombre', 'event_date', 'visitorid', 'itemid')
+            if c in sales_data.columns]
+    
+    # Un groupby simple por clave: con visitorid/itemid un groupby apilado tendría casi
+    # tantos grupos como filas y resultaba más lento que estas cinco pasadas
+    return {key: sales_data.groupby(key, observed=True)['revenue'].sum() for key in keys}
+
+def lttb_indices(x, y, n_out):
+    """Índices de los n_out puntos que conserva LTTB (Largest-Triangle-Three-Buckets)"""
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    # Fechas como enteros para calcular áreas; el primer y último punto siempre se conservan
+    if np.issubdtype(x.dtype, np.datetime64):
+        x = x.astype('datetime64[ns]').view('int64')
+    xs = x.astype('float64')
+    ys = y.astype('float64')
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    idx = np.empty(n_out, dtype=np.int64)
+    idx[0], idx[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        # Promedio del siguiente bucket (o el último punto) como tercer vértice
+        if i + 2 < len(edges):
+            next_x, next_y = xs[end:edges[i + 2]].mean(), ys[end:edges[i + 2]].mean()
+        else:
+            next_x, next_y = xs[-1], ys[-1]
+        area = np.abs((xs[a] - next_x) * (ys[start:end] - ys[a])
+                      - (xs[a] - xs[start:end]) * (next_y - ys[a]))
+        a = start + int(area.argmax())
+        idx[i + 1] = a
+    return idx
+
+def downsample_line(df, x, y, n_out=LTTB_MAX_POINTS):
+    """Reducir con LTTB un frame ordenado por x antes de graficarlo como línea"""
+    if len(df) <= n_out:
+        return df
+    return df.iloc[lttb_indices(df[x].to_numpy(), df[y].to_numpy(), n_out)]
+
+@st.cache_data(show_spinner=False)
+def event_type_counts(codes, categories):
+    """Conteo por tipo de evento con np.bincount sobre los códigos de la category (cacheado)"""
+    counts = np.bincount(codes[codes >= 0], minlength=len(categories))
+    event_counts = pd.DataFrame({'event': list(categories), 'count': counts})
+    # Mismo orden que value_counts: de mayor a menor
+    return event_counts.sort_values('count', ascending=False, kind='stable', ignore_index=True)
+
 def create_charts(sales_data, events):
     """Crear gráficos principales y métricas atractivas"""
     charts = {}
 
     if not sales_data.empty:
-        # --- Pie chart agrupando categorías <1.5% como 'Otras' ---
-        cat_sales = sales_data.groupby('categoria_nombre')['revenue'].sum().reset_index()
+        aggregates = compute_aggregates(sales_data)
+        
+        # Top 1 por entidad con idxmax sobre cada serie agregada (una pasada, sin ordenar)
+        for name, key in (('top_cliente', 'visitorid'), ('top_producto', 'itemid'),
+                          ('top_categoria', 'categoria_nombre'), ('top_marca', 'marca_nombre')):
+            if key in aggregates and not aggregates[key].empty:
+                top_id = aggregates[key].idxmax()
+                charts[name] = (top_id, aggregates[key].loc[top_id])
+        
+        # --- Pie chart agrupando categorías <1.5% (y las que pasan del top) como 'Otras' ---
+        cat_sales = aggregates['categoria_nombre'].reset_index()
         total = cat_sales['revenue'].sum()
         cat_sales['pct'] = cat_sales['revenue'] / total * 100
-        # Separar principales y otras
-        main_cats = cat_sales[cat_sales['pct'] >= 1.5].copy()
-        other_cats = cat_sales[cat_sales['pct'] < 1.5].copy()
-        if not other_cats.empty:
-            otras_row = pd.DataFrame({
-                'categoria_nombre': ['Otras'],
-                'revenue': [other_cats['revenue'].sum()],
-                'pct': [other_cats['pct'].sum()]
-            })
-            cat_sales_plot = pd.concat([main_cats, otras_row], ignore_index=True)
-        else:
-            cat_sales_plot = main_cats.copy()
-        fig_cat = px.pie(
-            cat_sales_plot,
-            values='revenue',
-            names='categoria_nombre',
-            title='Distribución de Ventas por Categoría',
-            color_discrete_sequence=px.colors.qualitative.Set3
-        )
+        # Separar principales (como máximo MAX_PIE_SLICES) y otras
+        top_cats = cat_sales.nlargest(MAX_PIE_SLICES, 'revenue').index
+        is_main = cat_sales.index.isin(top_cats) & (cat_sales['pct'] >= 1.5)
+        # Las demás se re-etiquetan como 'Otras' y se agregan con un solo groupby (sin
+        # separar, copiar y concatenar); las categorías fijan el orden: principales y luego 'Otras'
+        names = cat_sales['categoria_nombre'].astype(str).to_numpy()
+        plot_key = pd.Categorical(np.where(is_main, names, 'Otras'), categories=[*names[is_main], 'Otras'])
+        cat_sales_plot = (cat_sales.groupby(plot_key, observed=True)[['revenue', 'pct']].sum()
+                          .rename_axis('categoria_nombre').reset_index())
+        # Figuras con graph_objects directamente: los frames ya están agregados y
+        # se evita la inferencia de columnas/colores que hace plotly.express
+        fig_cat = go.Figure(go.Pie(
+            labels=cat_sales_plot['categoria_nombre'].to_numpy(),
+            values=cat_sales_plot['revenue'].to_numpy()
+        ))
         fig_cat.update_traces(
-            text=cat_sales_plot['categoria_nombre'],
+            text=cat_sales_plot['categoria_nombre'].to_numpy(),
+            # zip sobre arrays ya extraídos, sin crear una Series por fila como iterrows
             hovertemplate=[
-                f"{row['categoria_nombre']}: {row['pct']:.1f}%<br>Ventas: ${row['revenue']:,.2f}"
-                for _, row in cat_sales_plot.iterrows()
+                f"{nombre}: {pct:.1f}%<br>Ventas: ${revenue:,.2f}"
+                for nombre, revenue, pct in zip(
+                    cat_sales_plot['categoria_nombre'].to_numpy(),
+                    cat_sales_plot['revenue'].to_numpy(),
+                    cat_sales_plot['pct'].to_numpy(),
+                )
             ],
             textinfo='label'
         )
-        fig_cat.update_layout(height=400)
+        fig_cat.update_layout(
+            title='Distribución de Ventas por Categoría',
+            piecolorway=px.colors.qualitative.Set3,
+            height=400
+        )
         charts['category_sales'] = fig_cat
 
         # --- Top 10 Marcas ---
-        marca_sales = sales_data.groupby('marca_nombre')['revenue'].sum().sort_values(ascending=False).head(10).reset_index()
-        fig_marca = px.bar(
-            marca_sales, x='marca_nombre', y='revenue',
-            title='Top 10 Marcas por Ventas',
-            color='revenue',
-            color_continuous_scale='viridis'
-        )
-        fig_marca.update_layout(height=400, xaxis_tickangle=-45)
+        marca_sales = aggregates['marca_nombre'].nlargest(10).reset_index()
+        marca_revenue = marca_sales['revenue'].to_numpy()
+        fig_marca = go.Figure(go.Bar(
+            x=marca_sales['marca_nombre'].to_numpy(),
+            y=marca_revenue,
+            marker=dict(color=marca_revenue, colorscale='viridis', showscale=True)
+        ))
+        fig_marca.update_layout(title='Top 10 Marcas por Ventas', height=400, xaxis_tickangle=-45)
         charts['brand_sales'] = fig_marca
 
         # --- Ventas diarias ---
-        if 'event_time' in sales_data.columns:
-            daily_sales = sales_data.groupby(sales_data['event_time'].dt.date)['revenue'].sum().reset_index()
-            fig_time = px.line(
-                daily_sales, x='event_time', y='revenue',
-                title='Evolución de Ventas Diarias',
-                markers=True
-            )
-            fig_time.update_traces(line_color=COLORS['primary'])
-            fig_time.update_layout(height=400)
+        if 'event_date' in aggregates:
+            daily_sales = aggregates['event_date'].reset_index()
+            daily_plot = downsample_line(daily_sales, 'event_date', 'revenue')
+            scatter = go.Scattergl if len(daily_plot) > WEBGL_MIN_POINTS else go.Scatter
+            fig_time = go.Figure(scatter(
+                x=daily_plot['event_date'].to_numpy(),
+                y=daily_plot['revenue'].to_numpy(),
+                mode='lines+markers',
+                line=dict(color=COLORS['primary'])
+            ))
+            fig_time.update_layout(title='Evolución de Ventas Diarias', height=400)
             charts['time_sales'] = fig_time
 
         # --- KPIs y tablas atractivas ---
         # Puedes llamar a estos desde main() para mayor control visual
-        charts['ventas_cliente'] = sales_data.groupby('visitorid')['revenue'].sum().reset_index().sort_values('revenue', ascending=False).head(10)
-        charts['ventas_producto'] = sales_data.groupby('itemid')['revenue'].sum().reset_index().sort_values('revenue', ascending=False).head(10)
-        charts['ventas_categoria'] = cat_sales.sort_values('revenue', ascending=False).head(10)
+        # Top 10 con nlargest (heap) en vez de ordenar todos los grupos
+        # Clientes y productos salen de la misma agregación que el resto (sin re-escanear sales_data)
+        if 'visitorid' in aggregates:
+            charts['ventas_cliente'] = aggregates['visitorid'].nlargest(10).reset_index()
+        if 'itemid' in aggregates:
+            charts['ventas_producto'] = aggregates['itemid'].nlargest(10).reset_index()
+        charts['ventas_categoria'] = cat_sales.nlargest(10, 'revenue')
         charts['ventas_marca'] = marca_sales
-        if 'event_time' in sales_data.columns:
-            charts['ventas_fecha'] = sales_data.groupby(sales_data['event_time'].dt.date)['revenue'].sum().reset_index().sort_values('event_time')
+        if 'event_date' in aggregates:
+            charts['ventas_fecha'] = daily_sales
 
     # --- Eventos por tipo ---
     if not events.empty and 'event' in events.columns:
-        event_counts = events['event'].value_counts().reset_index()
-        fig_events = px.bar(
-            event_counts, x='event', y='count',
-            title='Distribución de Eventos por Tipo',
-            color='count',
-            color_continuous_scale='blues'
-        )
-        fig_events.update_layout(height=400)
+        event_counts = event_type_counts(events['event'].cat.codes.to_numpy(), tuple(events['event'].cat.categories))
+        event_totals = event_counts['count'].to_numpy()
+        fig_events = go.Figure(go.Bar(
+            x=event_counts['event'].to_numpy(),
+            y=event_totals,
+            marker=dict(color=event_totals, colorscale='blues', showscale=True)
+        ))
+        fig_events.update_layout(title='Distribución de Eventos por Tipo', height=400)
         charts['event_distribution'] = fig_events
 
     return charts
 
+@st.cache_data(show_spinner=False, max_entries=MAX_FILTER_CACHE_ENTRIES)
+def load_charts(_sales_data, _events, version, date_range=None, category=None):
+    """Gráficos cacheados por versión de los archivos y filtros.
+
+    Los frames determinan los gráficos pero quedan fuera de la clave (``_``), igual
+    que en ``load_sales_data``: un rerun con los mismos filtros no construye ni
+    hashea nada.
+    """
+    return create_charts(_sales_data, _events)
+
 # --- INICIO: Diccionario id -> nombre completo ---
-clientes_df = pd.read_csv('src/clean/cliente_clean.csv')
-id_to_nombre = {
-    float(row['id']): f"{row['nombre']} {row['apellido']}"
-    for _, row in clientes_df.iterrows()
-}
+@st.cache_data(show_spinner=False)
+def id_to_nombre(version):
+    """Serie id -> nombre completo, construida una vez por versión de los datos desde el loader cacheado"""
+    _, cliente = load_categories_and_clients(version)
+    nombres = cliente['nombre'].astype(str).str.cat(cliente['apellido'].astype(str), sep=' ')
+    # Serie indexada por el id original: el lookup es un join vectorizado, sin float()
+    mapping = pd.Series(nombres.to_numpy(), index=cliente['id'])
+    # Como en el diccionario original: con ids repetidos gana el último y un id nulo nunca coincide
+    return mapping[mapping.index.notna() & ~mapping.index.duplicated(keep='last')]
 # --- FIN ---
 
 # --- INICIO: Función para convertir lista de ids a nombres ---
@@ -309,7 +683,10 @@ def ids_a_nombres(lista_ids):
     """
     Convierte una lista de IDs en una lista de nombres completos.
     """
-    return [id_to_nombre.get(float(i), f"ID {i}") for i in lista_ids]
+    nombres = pd.Series(lista_ids).map(id_to_nombre(data_version()))
+    # El respaldo se formatea con los valores originales: la Series convierte una lista
+    # mixta int/float a float64 y un id faltante saldría como 'ID 123.0'
+    return [f"ID {i}" if pd.isna(nombre) else nombre for i, nombre in zip(lista_ids, nombres)]
 # --- FIN ---
 
 # --- INICIO: Función para reemplazar id por nombre completo en DataFrame ---
@@ -318,56 +695,52 @@ def reemplazar_id_por_nombre(df, columna_id='id'):
     Reemplaza la columna de id por el nombre completo en un DataFrame.
     """
     df = df.copy()
-    df['Cliente'] = df[columna_id].apply(lambda i: id_to_nombre.get(float(i), f"ID {i}"))
+    ids = df[columna_id]
+    df['Cliente'] = ids.map(id_to_nombre(data_version())).fillna("ID " + ids.astype(str))
     return df.drop(columns=[columna_id])
 # --- FIN ---
 
-def main():
-    # Header principal
-    st.markdown('<h1 class="main-header">📊 Dashboard Ejecutivo - Análisis de Ventas</h1>', 
-                unsafe_allow_html=True)
-    
-    # Cargar datos
-    with st.spinner('Cargando datos...'):
-        categoria, cliente, events, marca, producto = load_data()
-    
-    if categoria is None:
-        st.error("No se pudieron cargar los datos. Asegúrate de que la carpeta './clean' existe y contiene los archivos CSV.")
-        return
-    
-    # Crear datos de ventas
-    sales_data = create_sales_data(events, producto, categoria, marca, cliente)
-    
-    # Calcular KPIs
-    kpis = calculate_kpis(sales_data, events, cliente)
-    
-    # Sidebar con filtros
-    st.sidebar.header("🎛️ Filtros")
+@st.fragment
+def render_dashboard(all_sales_data, all_meta, kpis, events, producto, categoria, marca, cliente, version):
+    """Renderizar filtros, métricas, KPIs y gráficos a partir de los datos ya cargados"""
+    date_range = None
+    selected_category = None
     
     # Filtro de fecha
-    if not sales_data.empty and 'event_time' in sales_data.columns:
-        min_date = sales_data['event_time'].min().date()
-        max_date = sales_data['event_time'].max().date()
+    if not all_sales_data.empty and 'event_time' in all_sales_data.columns:
+        min_date = all_sales_data['event_time'].min().date()
+        max_date = all_sales_data['event_time'].max().date()
         
-        date_range = st.sidebar.date_input(
+        date_input = st.sidebar.date_input(
             "Rango de fechas:",
             value=[min_date, max_date],
             min_value=min_date,
             max_value=max_date
         )
         
-        if len(date_range) == 2:
-            start_date, end_date = date_range
-            mask = (sales_data['event_time'].dt.date >= start_date) & (sales_data['event_time'].dt.date <= end_date)
-            sales_data = sales_data[mask]
+        # El rango completo equivale a no filtrar y reutiliza el dataset sin filtrar
+        if len(date_input) == 2 and tuple(date_input) != (min_date, max_date):
+            date_range = tuple(date_input)
     
     # Filtro de categoría
-    if not sales_data.empty and 'categoria_nombre' in sales_data.columns:
-        categories = ['Todas'] + list(sales_data['categoria_nombre'].dropna().unique())
-        selected_category = st.sidebar.selectbox("Categoría:", categories)
+    if not all_sales_data.empty and 'categoria_nombre' in all_sales_data.columns:
+        # Solo se ofrecen las categorías con ventas dentro del rango de fechas
+        window_data = all_sales_data
+        if date_range is not None:
+            window_data, _ = load_sales_data((events, producto, categoria, marca, cliente), version,
+                                             date_range=date_range)
+        categories = ['Todas'] + list(window_data['categoria_nombre'].dropna().unique())
+        category_input = st.sidebar.selectbox("Categoría:", categories)
         
-        if selected_category != 'Todas':
-            sales_data = sales_data[sales_data['categoria_nombre'] == selected_category]
+        if category_input != 'Todas':
+            selected_category = category_input
+    
+    # Los filtros se empujan dentro de create_sales_data, antes de los merges
+    if date_range is None and selected_category is None:
+        sales_data, meta = all_sales_data, all_meta
+    else:
+        sales_data, meta = load_sales_data((events, producto, categoria, marca, cliente), version,
+                                           date_range=date_range, category=selected_category)
     
     # Métricas principales
     st.header("📈 Métricas Principales")
@@ -377,12 +750,13 @@ def main():
     with col1:
         st.metric(
             label="💰 Revenue Total",
-            value=f"${sales_data['revenue'].sum():,.2f}" if not sales_data.empty else "$0.00",
+            # revenue es float32: el total se acumula en float64 para no perder centavos
+            value=f"${sales_data['revenue'].to_numpy().sum(dtype=np.float64):,.2f}" if not sales_data.empty else "$0.00",
             delta=f"{len(sales_data)} transacciones"
         )
     
     with col2:
-        visitor_count = sales_data['visitorid'].nunique() if 'visitorid' in sales_data.columns and not sales_data.empty else 0
+        visitor_count = meta['n_visitors']
         st.metric(
             label="👥 Visitantes Únicos",
             value=f"{visitor_count:,}",
@@ -390,7 +764,7 @@ def main():
         )
     
     with col3:
-        item_count = sales_data['itemid'].nunique() if 'itemid' in sales_data.columns and not sales_data.empty else 0
+        item_count = meta['n_items']
         st.metric(
             label="📦 Productos con Actividad",
             value=f"{item_count:,}",
@@ -454,7 +828,7 @@ def main():
         )
     
     # Gráficos principales
-    charts = create_charts(sales_data, events)
+    charts = load_charts(sales_data, events, version, date_range=date_range, category=selected_category)
     
     if charts:
         # Primera fila de gráficos
@@ -483,47 +857,47 @@ def main():
             # Top 1 visual cards
             card_col1, card_col2, card_col3, card_col4 = st.columns(4)
             # Top Cliente
-            if 'ventas_cliente' in charts and not charts['ventas_cliente'].empty:
-                top_cliente = charts['ventas_cliente'].iloc[0]
+            if 'top_cliente' in charts:
+                top_cliente_id, top_cliente_revenue = charts['top_cliente']
                 with card_col1:
                     st.markdown(f"""
                     <div class="metric-card">
                         <h3>🧑‍💼 Cliente Top</h3>
-                        <h2>{top_cliente['visitorid']}</h2>
-                        <p><b>${top_cliente['revenue']:,.2f}</b></p>
+                        <h2>{top_cliente_id}</h2>
+                        <p><b>${top_cliente_revenue:,.2f}</b></p>
                     </div>
                     """, unsafe_allow_html=True)
             # Top Producto
-            if 'ventas_producto' in charts and not charts['ventas_producto'].empty:
-                top_producto = charts['ventas_producto'].iloc[0]
+            if 'top_producto' in charts:
+                top_producto_id, top_producto_revenue = charts['top_producto']
                 with card_col2:
                     st.markdown(f"""
                     <div class="metric-card">
                         <h3>📦 Producto Top</h3>
-                        <h2>{top_producto['itemid']}</h2>
-                        <p><b>${top_producto['revenue']:,.2f}</b></p>
+                        <h2>{top_producto_id}</h2>
+                        <p><b>${top_producto_revenue:,.2f}</b></p>
                     </div>
                     """, unsafe_allow_html=True)
             # Top Categoría
-            if 'ventas_categoria' in charts and not charts['ventas_categoria'].empty:
-                top_categoria = charts['ventas_categoria'].iloc[0]
+            if 'top_categoria' in charts:
+                top_categoria_id, top_categoria_revenue = charts['top_categoria']
                 with card_col3:
                     st.markdown(f"""
                     <div class="metric-card">
                         <h3>🏷️ Categoría Top</h3>
-                        <h2>{top_categoria['categoria_nombre']}</h2>
-                        <p><b>${top_categoria['revenue']:,.2f}</b></p>
+                        <h2>{top_categoria_id}</h2>
+                        <p><b>${top_categoria_revenue:,.2f}</b></p>
                     </div>
                     """, unsafe_allow_html=True)
             # Top Marca
-            if 'ventas_marca' in charts and not charts['ventas_marca'].empty:
-                top_marca = charts['ventas_marca'].iloc[0]
+            if 'top_marca' in charts:
+                top_marca_id, top_marca_revenue = charts['top_marca']
                 with card_col4:
                     st.markdown(f"""
                     <div class="metric-card">
                         <h3>🏭 Marca Top</h3>
-                        <h2>{top_marca['marca_nombre']}</h2>
-                        <p><b>${top_marca['revenue']:,.2f}</b></p>
+                        <h2>{top_marca_id}</h2>
+                        <p><b>${top_marca_revenue:,.2f}</b></p>
                     </div>
                     """, unsafe_allow_html=True)
 
@@ -580,35 +954,69 @@ def main():
             st.markdown("#### 📅 Ventas por Fecha")
             if 'ventas_fecha' in charts and not charts['ventas_fecha'].empty:
                 fig_fecha = px.line(
-                    charts['ventas_fecha'], x='event_time', y='revenue',
+                    downsample_line(charts['ventas_fecha'], 'event_date', 'revenue'), x='event_date', y='revenue',
                     markers=True, line_shape='spline',
-                    labels={'event_time': 'Fecha', 'revenue': 'Ventas'},
+                    labels={'event_date': 'Fecha', 'revenue': 'Ventas'},
                     title='Ventas por Fecha',
                     color_discrete_sequence=[COLORS['primary']]
                 )
                 fig_fecha.update_layout(height=350, xaxis_title=None, yaxis_title=None, showlegend=False)
                 st.plotly_chart(fig_fecha, use_container_width=True)
 
-            # Tablas detalladas en un expander
+            # Tablas detalladas en un expander; el formato de moneda lo aplica el navegador
+            # (column_config) en lugar de redondear los datos
+            table_config = {
+                'revenue': st.column_config.NumberColumn(format='$%.2f'),
+                'pct': st.column_config.NumberColumn(format='%.1f%%'),
+                'event_date': st.column_config.DateColumn(format='YYYY-MM-DD'),
+            }
             with st.expander("Ver tablas detalladas de ventas por entidad"):
                 st.markdown("##### Top 10 Clientes")
                 if 'ventas_cliente' in charts:
-                    st.dataframe(charts['ventas_cliente'], use_container_width=True)
+                    st.dataframe(charts['ventas_cliente'], use_container_width=True, column_config=table_config)
                 st.markdown("##### Top 10 Productos")
                 if 'ventas_producto' in charts:
-                    st.dataframe(charts['ventas_producto'], use_container_width=True)
+                    st.dataframe(charts['ventas_producto'], use_container_width=True, column_config=table_config)
                 st.markdown("##### Top 10 Categorías")
                 if 'ventas_categoria' in charts:
-                    st.dataframe(charts['ventas_categoria'], use_container_width=True)
+                    st.dataframe(charts['ventas_categoria'], use_container_width=True, column_config=table_config)
                 st.markdown("##### Top 10 Marcas")
                 if 'ventas_marca' in charts:
-                    st.dataframe(charts['ventas_marca'], use_container_width=True)
+                    st.dataframe(charts['ventas_marca'], use_container_width=True, column_config=table_config)
                 st.markdown("##### Ventas por Fecha")
                 if 'ventas_fecha' in charts:
-                    st.dataframe(charts['ventas_fecha'], use_container_width=True)
+                    st.dataframe(charts['ventas_fecha'], use_container_width=True, column_config=table_config)
         else:
             st.info("No hay datos de actividad para mostrar.")
 
+def main():
+    # Header principal
+    st.markdown('<h1 class="main-header">📊 Dashboard Ejecutivo - Análisis de Ventas</h1>', 
+                unsafe_allow_html=True)
+    
+    # Cargar datos
+    with st.spinner('Cargando datos...'):
+        categoria, cliente, events, marca, producto, version = load_data()
+    
+    if categoria is None:
+        st.error("No se pudieron cargar los datos. Asegúrate de que la carpeta './clean' existe y contiene los archivos CSV.")
+        return
+    
+    # Crear datos de ventas sin filtrar (base de los KPIs y de las opciones de filtro). Se usa
+    # la versión con la que load_data cargó las tablas: recalcularla aquí dejaría datos viejos
+    # cacheados bajo una versión nueva si los archivos cambian entre ambas llamadas
+    all_sales_data, all_meta = load_sales_data((events, producto, categoria, marca, cliente), version)
+    
+    # Calcular KPIs
+    kpis = calculate_kpis(all_meta)
+    
+    # Sidebar con filtros
+    st.sidebar.header("🎛️ Filtros")
+    
+    # Filtros, métricas y gráficos se re-ejecutan como fragmento: al mover un filtro
+    # no se vuelve a correr la carga de datos ni los KPIs de arriba
+    render_dashboard(all_sales_data, all_meta, kpis, events, producto, categoria, marca, cliente, version)
+    
     # Información adicional
     with st.expander("ℹ️ Información del Dashboard"):
         st.markdown("""